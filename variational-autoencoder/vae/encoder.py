@@ -1,3 +1,5 @@
+import os
+
 import torch
 import torch.nn as nn
 
@@ -5,7 +7,12 @@ from typeguard import typechecked
 from torchtyping import TensorType, patch_typeguard
 from typing import Tuple
 
-patch_typeguard()
+TYPECHECK = os.environ.get("TYPECHECK", "0") == "1"
+
+if TYPECHECK:
+    patch_typeguard()
+else:
+    typechecked = lambda f: f  # noqa: E731
 
 class Encoder(nn.Module):
     